@@ -0,0 +1,495 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from ingest import current_generation
+from queries import convert_to_minutes, generate_sql_query, to_number
+
+# Headless HTTP service exposing the dashboard's Natural Language Query and
+# Standard Dashboard filters over the same movies database, for consumers that
+# can't go through the Streamlit UI.
+#
+#   python api.py --port 8000
+#   curl "http://127.0.0.1:8000/query?q=top+5+highest+rated+movies"
+#   curl "http://127.0.0.1:8000/movies?genre=horror&min_rating=7&limit=20"
+#
+# SQLite reads run in a bounded thread pool, identical in-flight requests share
+# one database read, results are kept in a shared LRU cache, and large results
+# are streamed back as NDJSON. The ingest generation (see ingest.py) is polled
+# and the cache is dropped when a new ingest lands.
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "movies_2024.db")
+
+# Result sets bigger than this are streamed as NDJSON instead of one JSON body
+STREAM_THRESHOLD = 1000
+STREAM_BATCH_ROWS = 500
+
+MAX_HEADER_BYTES = 16 * 1024
+
+# No endpoint reads a request body, so only small ones are read and discarded
+MAX_BODY_BYTES = 4 * 1024
+
+# Seconds a single SQLite read may run before it is interrupted
+QUERY_TIMEOUT = 2.0
+
+# SQLite virtual machine instructions between deadline checks
+PROGRESS_INTERVAL = 10000
+
+# Largest value SQLite accepts for LIMIT and OFFSET
+MAX_SQL_INTEGER = 2 ** 63 - 1
+
+# Sort options of the Standard Dashboard, keyed by the API's `sort` parameter
+SORT_OPTIONS = {
+    "rating": "COALESCE(CAST(Rating AS REAL), 0) DESC",
+    "votes": "COALESCE(CAST(Votes AS REAL), 0) DESC",
+    "duration_desc": "Duration_Minutes DESC",
+    "duration_asc": "Duration_Minutes ASC",
+}
+
+# Numeric range filters of the Standard Dashboard: parameter -> SQL condition
+RANGE_FILTERS = {
+    "min_rating": "COALESCE(CAST(Rating AS REAL), 0) >= ?",
+    "max_rating": "COALESCE(CAST(Rating AS REAL), 0) <= ?",
+    "min_votes": "COALESCE(CAST(Votes AS REAL), 0) >= ?",
+    "max_votes": "COALESCE(CAST(Votes AS REAL), 0) <= ?",
+    "min_duration": "Duration_Minutes >= ?",
+    "max_duration": "Duration_Minutes <= ?",
+}
+
+HTTP_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Content Too Large",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class BadRequest(Exception):
+    pass
+
+
+class QueryTimeout(Exception):
+    pass
+
+
+# One read-only connection per worker thread. Every call starts a new
+# deadline; statements still running past it are interrupted by the progress
+# handler and fail with sqlite3.OperationalError.
+_local = threading.local()
+
+
+def query_expired():
+    return time.monotonic() > _local.deadline
+
+
+def get_connection(db_path, timeout=QUERY_TIMEOUT, generation=None):
+    _local.deadline = time.monotonic() + timeout
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+        _local.snapshots = {}
+
+    conn = connections.get(db_path)
+    if conn is None:
+        uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True)
+        conn.create_function("duration_minutes", 1, convert_to_minutes, deterministic=True)
+        conn.set_progress_handler(query_expired, PROGRESS_INTERVAL)
+        connections[db_path] = conn
+
+    if generation is not None and _local.snapshots.get(db_path) != generation:
+        build_movies_snapshot(conn)
+        _local.snapshots[db_path] = generation
+        # The query itself still gets the full time limit
+        _local.deadline = time.monotonic() + timeout
+    return conn
+
+
+# The `movies` table stores the raw "2h 15m" durations. A temporary copy with
+# the Duration_Minutes column the dashboard derives with convert_to_minutes
+# shadows it, so the conversion runs once per ingest generation rather than for
+# every row of every query.
+def build_movies_snapshot(conn):
+    conn.execute("DROP TABLE IF EXISTS temp.movies")
+    columns = [row[1] for row in conn.execute("PRAGMA main.table_info(movies)")]
+    if columns and "Duration_Minutes" not in columns:
+        conn.execute(
+            "CREATE TEMP TABLE movies AS "
+            "SELECT *, duration_minutes(Duration) AS Duration_Minutes FROM main.movies"
+        )
+
+
+# Mirror load_data: Rating and Votes are numeric and missing values become 0.
+# Duration_Minutes is derived after that fill in the dashboard, so it stays null.
+def normalize_row(columns, row):
+    record = dict(zip(columns, row))
+    for column in ("Rating", "Votes"):
+        if column in record:
+            record[column] = to_number(record[column])
+    return {
+        column: (0 if value is None and column != "Duration_Minutes" else value)
+        for column, value in record.items()
+    }
+
+
+# Runs in the thread pool. Rows are JSON-encoded here, once per database read,
+# so cached results can be written out without touching the event loop.
+def run_query(db_path, sql, params, timeout=QUERY_TIMEOUT, generation=None):
+    try:
+        conn = get_connection(db_path, timeout, generation)
+        cursor = conn.execute(sql, params)
+        columns = [description[0] for description in cursor.description or ()]
+        rows = [json.dumps(normalize_row(columns, row)).encode("utf-8") for row in cursor.fetchall()]
+    except sqlite3.OperationalError:
+        if query_expired():
+            raise QueryTimeout(f"Query exceeded the {timeout:g}s time limit")
+        raise
+    return columns, rows
+
+
+def read_generation(db_path):
+    return current_generation(get_connection(db_path))
+
+
+class ResultCache:
+    # LRU cache of query results with a time-to-live, shared by all endpoints
+
+    def __init__(self, max_entries=256, ttl=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class QueryService:
+    def __init__(self, db_path=DEFAULT_DB_PATH, workers=4, cache_size=256, cache_ttl=60.0,
+                 stream_threshold=STREAM_THRESHOLD, poll_interval=2.0, query_timeout=QUERY_TIMEOUT):
+        self.db_path = db_path
+        self.query_timeout = query_timeout
+        self.poll_interval = poll_interval
+        self.generation = 0
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="movies-db")
+        self.cache = ResultCache(cache_size, cache_ttl)
+        self.stream_threshold = stream_threshold
+        self._inflight = {}
+        self.stats = {"requests": 0, "cache_hits": 0, "coalesced": 0, "db_reads": 0}
+
+    # Fetch a result from the cache, join an identical in-flight read, or start
+    # a new read in the thread pool
+    async def fetch(self, sql, params=()):
+        # Reads started before a new ingest are kept under their old generation
+        key = (self.generation, sql, tuple(params))
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return cached
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["db_reads"] += 1
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(
+                self.executor, run_query, self.db_path, sql, tuple(params), self.query_timeout, key[0]
+            )
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._finish(key, done))
+        # Shield so one client disconnecting doesn't cancel the shared read
+        return await asyncio.shield(future)
+
+    def _finish(self, key, future):
+        self._inflight.pop(key, None)
+        if not future.cancelled() and future.exception() is None and key[0] == self.generation:
+            self.cache.put(key, future.result())
+
+    # Poll the ingest generation and drop cached results once it moves
+    async def watch_generation(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                generation = await loop.run_in_executor(self.executor, read_generation, self.db_path)
+            except sqlite3.Error:
+                generation = self.generation
+            if generation != self.generation:
+                self.generation = generation
+                self.cache.clear()
+            await asyncio.sleep(self.poll_interval)
+
+    # GET /query?q=<plain English>
+    def build_nl_query(self, params):
+        user_query = params.get("q", "").strip()
+        if not user_query:
+            raise BadRequest("Missing query parameter 'q'")
+        return generate_sql_query(user_query), ()
+
+    # GET /movies?genre=&min_rating=&max_rating=&min_votes=&max_votes=
+    #             &min_duration=&max_duration=&sort=&limit=&offset=
+    def build_filter_query(self, params):
+        conditions = ["Duration_Minutes IS NOT NULL"]
+        values = []
+
+        genre = params.get("genre", "All")
+        if genre and genre != "All":
+            conditions.append("genre = ?")
+            values.append(genre)
+
+        for name, condition in RANGE_FILTERS.items():
+            if name in params:
+                try:
+                    value = float(params[name])
+                except ValueError:
+                    raise BadRequest(f"'{name}' must be a number")
+                if not math.isfinite(value):
+                    raise BadRequest(f"'{name}' must be a finite number")
+                values.append(value)
+                conditions.append(condition)
+
+        sort = params.get("sort", "rating")
+        if sort not in SORT_OPTIONS:
+            raise BadRequest(f"'sort' must be one of: {', '.join(SORT_OPTIONS)}")
+
+        sql = f"SELECT * FROM movies WHERE {' AND '.join(conditions)} ORDER BY {SORT_OPTIONS[sort]}"
+
+        if "limit" in params or "offset" in params:
+            try:
+                limit = int(params.get("limit", MAX_SQL_INTEGER))
+                offset = int(params.get("offset", 0))
+            except ValueError:
+                raise BadRequest("'limit' and 'offset' must be integers")
+            if not (0 <= limit <= MAX_SQL_INTEGER and 0 <= offset <= MAX_SQL_INTEGER):
+                raise BadRequest(f"'limit' and 'offset' must be between 0 and {MAX_SQL_INTEGER}")
+            sql += " LIMIT ? OFFSET ?"
+            values.extend([limit, offset])
+
+        return sql, values
+
+    # Answers one request and returns whether the connection can stay open
+    async def handle(self, method, target, version, headers, writer, keep_alive):
+        self.stats["requests"] += 1
+        url = urlsplit(target)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+
+        if method != "GET":
+            return await send_json(writer, 405, {"error": "Only GET is supported"}, keep_alive)
+
+        if url.path == "/health":
+            return await send_json(writer, 200, {"status": "ok"}, keep_alive)
+        if url.path == "/stats":
+            stats = dict(
+                self.stats, generation=self.generation, cached_results=len(self.cache), inflight=len(self._inflight)
+            )
+            return await send_json(writer, 200, stats, keep_alive)
+
+        if url.path == "/query":
+            builder = self.build_nl_query
+        elif url.path == "/movies":
+            builder = self.build_filter_query
+        else:
+            return await send_json(writer, 404, {"error": f"Unknown path {url.path}"}, keep_alive)
+
+        try:
+            sql, values = builder(params)
+            columns, rows = await self.fetch(sql, values)
+        except BadRequest as e:
+            return await send_json(writer, 400, {"error": str(e)}, keep_alive)
+        except QueryTimeout as e:
+            return await send_json(writer, 503, {"error": str(e), "sql": sql}, keep_alive)
+        except sqlite3.Error as e:
+            return await send_json(writer, 400, {"error": f"Error loading data: {e}", "sql": sql}, keep_alive)
+
+        wants_ndjson = (
+            params.get("format") == "ndjson"
+            or "application/x-ndjson" in headers.get("accept", "")
+        )
+        if wants_ndjson or len(rows) > self.stream_threshold:
+            return await send_ndjson(writer, rows, keep_alive, chunked=version == "HTTP/1.1")
+
+        meta = json.dumps({"sql": sql, "columns": columns, "count": len(rows)}).encode("utf-8")
+        body = meta[:-1] + b', "rows": [' + b", ".join(rows) + b"]}"
+        return await send_body(writer, 200, "application/json", body, keep_alive)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    break
+                except asyncio.LimitOverrunError:
+                    await send_json(writer, 431, {"error": "Request headers too large"}, False)
+                    break
+
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = request_line.split(" ", 2)
+                except ValueError:
+                    await send_json(writer, 400, {"error": "Malformed request line"}, False)
+                    break
+
+                headers = {}
+                for line in header_lines:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                # Request bodies are not used by any endpoint
+                try:
+                    length = int(headers.get("content-length", 0) or 0)
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    await send_json(writer, 400, {"error": "Malformed Content-Length header"}, False)
+                    break
+                if length > MAX_BODY_BYTES:
+                    await send_json(writer, 413, {"error": "Request bodies are not supported"}, False)
+                    break
+                if length:
+                    try:
+                        await reader.readexactly(length)
+                    except asyncio.IncompleteReadError:
+                        break
+
+                connection = headers.get("connection", "").lower()
+                if version == "HTTP/1.1":
+                    keep_alive = connection != "close"
+                else:
+                    keep_alive = connection == "keep-alive"
+
+                try:
+                    keep_alive = await self.handle(method, target, version, headers, writer, keep_alive)
+                except (ConnectionError, asyncio.CancelledError):
+                    raise
+                except Exception as e:
+                    await send_json(writer, 500, {"error": str(e)}, False)
+                    break
+
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8000):
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        addresses = ", ".join(f"{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in server.sockets)
+        print(f"Serving movies API on {addresses} (db: {self.db_path})")
+        watcher = asyncio.create_task(self.watch_generation())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+            self.executor.shutdown(wait=False)
+
+
+def response_head(status, content_type, keep_alive, extra_headers=()):
+    lines = [
+        f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}",
+        f"Content-Type: {content_type}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        *extra_headers,
+    ]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def send_body(writer, status, content_type, body, keep_alive):
+    writer.write(response_head(status, content_type, keep_alive, [f"Content-Length: {len(body)}"]))
+    writer.write(body)
+    await writer.drain()
+    return keep_alive
+
+
+async def send_json(writer, status, payload, keep_alive):
+    return await send_body(writer, status, "application/json", json.dumps(payload).encode("utf-8"), keep_alive)
+
+
+# Stream pre-encoded rows as newline-delimited JSON using chunked transfer
+# encoding, draining between batches so slow clients apply backpressure.
+# HTTP/1.0 clients don't understand chunking, so they get the raw lines and
+# the end of the body is marked by closing the connection.
+async def send_ndjson(writer, rows, keep_alive, chunked=True):
+    if chunked:
+        writer.write(response_head(200, "application/x-ndjson", keep_alive, ["Transfer-Encoding: chunked"]))
+    else:
+        keep_alive = False
+        writer.write(response_head(200, "application/x-ndjson", keep_alive))
+    for start in range(0, len(rows), STREAM_BATCH_ROWS):
+        chunk = b"\n".join(rows[start:start + STREAM_BATCH_ROWS]) + b"\n"
+        writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk) if chunked else chunk)
+        await writer.drain()
+    if chunked:
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+    return keep_alive
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless query API for the Movies Dashboard 2024 database")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Path to the movies SQLite database")
+    parser.add_argument("--workers", type=int, default=4, help="Threads used for SQLite reads")
+    parser.add_argument("--query-timeout", type=float, default=QUERY_TIMEOUT,
+                        help="Seconds a single query may run before it is interrupted")
+    parser.add_argument("--cache-size", type=int, default=256, help="Cached results (0 disables the cache)")
+    parser.add_argument("--cache-ttl", type=float, default=60.0, help="Seconds a cached result stays valid")
+    parser.add_argument("--stream-threshold", type=int, default=STREAM_THRESHOLD,
+                        help="Stream results with more rows than this as NDJSON")
+    parser.add_argument("--poll-interval", type=float, default=2.0,
+                        help="Seconds between checks for a new ingest generation")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"Database not found: {args.db}")
+
+    service = QueryService(
+        args.db, args.workers, args.cache_size, args.cache_ttl, args.stream_threshold, args.poll_interval,
+        args.query_timeout,
+    )
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
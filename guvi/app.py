@@ -6,7 +6,11 @@ import os
 import matplotlib.pyplot as plt
 import seaborn as sns
 import time
-import re
+import threading
+
+from ingest import current_generation, table_columns
+from movie_store import convert_movie_types, refresh_movie_store
+from queries import convert_to_minutes, generate_sql_query
 
 # Set page configuration
 st.set_page_config(
@@ -151,22 +155,19 @@ if not db_exists:
     
     st.success("Sample movie database created successfully!")
 
-# Function to convert duration to minutes
-def convert_to_minutes(duration):
+# Function to read the latest ingest generation (see ingest.py)
+def get_data_generation():
+    conn = sqlite3.connect(db_path)
     try:
-        hours = 0
-        minutes = 0
-        if 'h' in duration:
-            hours = int(duration.split('h')[0].strip())
-        if 'm' in duration:
-            minutes = int(duration.split('h')[-1].replace('m', '').strip()) if 'h' in duration else int(duration.replace('m', '').strip())
-        return hours * 60 + minutes
-    except:
-        return None  # Return None for invalid formats
+        return current_generation(conn)
+    finally:
+        conn.close()
 
-# Function to load data from database with custom SQL query option
+# Function to load data from database with custom SQL query option.
+# `generation` is only part of the cache key, so cached results are
+# reloaded once a new ingest lands.
 @st.cache_data
-def load_data(custom_query=None):
+def load_data(custom_query=None, generation=0):
     try:
         conn = sqlite3.connect(db_path)
         
@@ -188,85 +189,49 @@ def load_data(custom_query=None):
         conn.close()
         
         # Convert data types
-        if 'Rating' in df.columns:
-            df["Rating"] = pd.to_numeric(df["Rating"], errors='coerce')
-        if 'Votes' in df.columns:
-            df["Votes"] = pd.to_numeric(df["Votes"], errors='coerce')
-        df = df.fillna(0)
-        
-        return df
+        return convert_movie_types(df)
     
     except Exception as e:
         st.error(f"Error loading data: {e}")
         return pd.DataFrame()
 
-# Function to generate SQL query from natural language
-def generate_sql_query(user_query):
-    user_query = user_query.lower()
-    
-    # Dictionary of common query patterns and corresponding SQL
-    query_patterns = {
-        # Duration-related queries
-        r"duration.*(asc|ascending|shortest|short)": "SELECT * FROM movies ORDER BY Duration_Minutes ASC",
-        r"duration.*(desc|descending|longest|long)": "SELECT * FROM movies ORDER BY Duration_Minutes DESC",
-        
-        # Rating-related queries
-        r"highest.*(rating|rated)": "SELECT * FROM movies ORDER BY Rating DESC",
-        r"lowest.*(rating|rated)": "SELECT * FROM movies ORDER BY Rating ASC",
-        r"rating.*above (\d+\.?\d*)": lambda match: f"SELECT * FROM movies WHERE Rating > {match.group(1)}",
-        r"rating.*between (\d+\.?\d*) and (\d+\.?\d*)": lambda match: f"SELECT * FROM movies WHERE Rating BETWEEN {match.group(1)} AND {match.group(2)}",
-        
-        # Vote-related queries
-        r"(most popular|highest vote|most votes)": "SELECT * FROM movies ORDER BY Votes DESC",
-        r"(least popular|lowest vote|fewest votes)": "SELECT * FROM movies ORDER BY Votes ASC",
-        r"votes?.*above (\d+)": lambda match: f"SELECT * FROM movies WHERE Votes > {match.group(1)}",
-        
-        # Genre-related queries
-        r"(all|show|list) (\w+) movies": lambda match: f"SELECT * FROM movies WHERE genre = '{match.group(2)}'",
-        r"(\w+) movies.*(rating|rated).*above (\d+\.?\d*)": lambda match: f"SELECT * FROM movies WHERE genre = '{match.group(1)}' AND Rating > {match.group(3)}",
-        
-        # Title-related queries
-        r"title.*(contain|including|with) (.+)": lambda match: f"SELECT * FROM movies WHERE Title LIKE '%{match.group(2)}%'",
-        
-        # Top N queries
-        r"top (\d+).*rating": lambda match: f"SELECT * FROM movies ORDER BY Rating DESC LIMIT {match.group(1)}",
-        r"top (\d+).*votes": lambda match: f"SELECT * FROM movies ORDER BY Votes DESC LIMIT {match.group(1)}",
-        r"top (\d+) (\w+) movies": lambda match: f"SELECT * FROM movies WHERE genre = '{match.group(2)}' ORDER BY Rating DESC LIMIT {match.group(1)}",
-        
-        # Average queries
-        r"average.*rating.*genre": "SELECT genre, AVG(Rating) as avg_rating FROM movies GROUP BY genre ORDER BY avg_rating DESC",
-        r"average.*duration.*genre": "SELECT genre, AVG(Duration_Minutes) as avg_duration FROM movies GROUP BY genre ORDER BY avg_duration DESC",
-        
-        # Count queries
-        r"(count|number of|how many).*(\w+) movies": lambda match: f"SELECT COUNT(*) as movie_count FROM movies WHERE genre = '{match.group(2)}'",
-        r"(count|number of|how many).*(genre|movies)": "SELECT genre, COUNT(*) as movie_count FROM movies GROUP BY genre ORDER BY movie_count DESC",
-        
-        # Above/below average
-        r"above.*(average|avg).*rating": "SELECT * FROM movies WHERE Rating > (SELECT AVG(Rating) FROM movies)",
-        r"below.*(average|avg).*rating": "SELECT * FROM movies WHERE Rating < (SELECT AVG(Rating) FROM movies)",
-        
-        # Best/worst in genre
-        r"(best|highest).* (\w+)": lambda match: f"SELECT * FROM movies WHERE genre = '{match.group(2)}' ORDER BY Rating DESC LIMIT 1",
-        r"(worst|lowest).* (\w+)": lambda match: f"SELECT * FROM movies WHERE genre = '{match.group(2)}' ORDER BY Rating ASC LIMIT 1",
-        
-        # Runtime queries
-        r"(shorter|less) than (\d+).*minutes": lambda match: f"SELECT * FROM movies WHERE Duration_Minutes < {match.group(2)}",
-        r"(longer|more) than (\d+).*minutes": lambda match: f"SELECT * FROM movies WHERE Duration_Minutes > {match.group(2)}",
-        
-        # Default query if no pattern matches
-        "default": "SELECT * FROM movies"
+# Movie data for the Standard Dashboard, shared by all sessions of this
+# server process and patched with only the changed rows after an ingest
+@st.cache_resource
+def get_movie_store():
+    return {
+        "lock": threading.Lock(),
+        "generation": None,
+        "df": None,
+        "genre_rollups": None,
     }
-    
-    # Try to match the user query with patterns and get corresponding SQL
-    for pattern, sql in query_patterns.items():
-        match = re.search(pattern, user_query)
-        if match:
-            if callable(sql):
-                return sql(match)
-            return sql
-    
-    # If no pattern matches, return the default query
-    return query_patterns["default"]
+
+# Function to load the movies and genre rollups, applying any ingest
+# generations newer than the cached ones (see movie_store.py)
+def load_movie_store():
+    store = get_movie_store()
+    with store["lock"]:
+        try:
+            conn = sqlite3.connect(db_path)
+            try:
+                if not table_columns(conn, "movies"):
+                    st.error("The 'movies' table does not exist in the database.")
+                    return pd.DataFrame(), None
+                
+                refresh_movie_store(store, conn)
+            finally:
+                conn.close()
+        except Exception as e:
+            st.error(f"Error loading data: {e}")
+            return pd.DataFrame(), None
+        
+        return store["df"], store["genre_rollups"]
+
+# Function to average a column per genre, from the rollups when they cover the data shown
+def genre_average(df, genre_rollups, column, rollup_column):
+    if genre_rollups is not None:
+        return (genre_rollups[rollup_column] / genre_rollups["count"]).rename(column).reset_index()
+    return df.groupby("genre")[column].mean().reset_index()
 
 # Sidebar for navigation and query options
 st.sidebar.header("Movies Dashboard Navigation")
@@ -277,6 +242,9 @@ nav_option = st.sidebar.radio(
     ["Standard Dashboard", "Natural Language Query", "Custom SQL Query"]
 )
 
+# Genre rollups are only kept for the Standard Dashboard
+genre_rollups = None
+
 # If Natural Language Query is selected
 if nav_option == "Natural Language Query":
     st.sidebar.subheader("Ask in Plain English")
@@ -315,7 +283,7 @@ if nav_option == "Natural Language Query":
             st.code(generated_sql, language="sql")
         
         # Load data with the generated query
-        movies_df = load_data(generated_sql)
+        movies_df = load_data(generated_sql, get_data_generation())
         
         # Add Duration_Minutes if not in the result
         if 'Duration' in movies_df.columns and 'Duration_Minutes' not in movies_df.columns:
@@ -352,7 +320,7 @@ elif nav_option == "Custom SQL Query":
         """)
     
     # Load data with custom query
-    movies_df = load_data(sql_query)
+    movies_df = load_data(sql_query, get_data_generation())
     
     # Add Duration_Minutes if not in the result
     if 'Duration' in movies_df.columns and 'Duration_Minutes' not in movies_df.columns:
@@ -360,20 +328,14 @@ elif nav_option == "Custom SQL Query":
 
 # Standard Dashboard with filters
 else:  # Standard Dashboard
-    # Load all movie data with default query
-    movies_df = load_data()
-    
-    # Convert Duration to Minutes for all rows
-    movies_df["Duration_Minutes"] = movies_df["Duration"].apply(convert_to_minutes)
-    
-    # Drop rows with invalid durations
-    movies_df = movies_df.dropna(subset=["Duration_Minutes"])
+    # Load all movie data, patched with the latest ingest
+    movies_df, genre_rollups = load_movie_store()
 
     # Standard filtering options
     st.sidebar.subheader("Filters & Sorting")
     
     # Genre filter
-    genres = ["All"] + sorted(movies_df["genre"].unique().tolist())
+    genres = ["All"] + sorted(genre_rollups.index.tolist() if genre_rollups is not None else [])
     selected_genre = st.sidebar.selectbox("Select Genre", genres, key="genre_select")
     
     # Rating filter
@@ -431,6 +393,10 @@ else:  # Standard Dashboard
     else:  # Duration (Short to Long)
         filtered_data = filtered_data.sort_values("Duration_Minutes", ascending=True)
     
+    # The genre rollups only describe the data when no filter removed rows
+    if len(filtered_data) != len(movies_df):
+        genre_rollups = None
+    
     # Update movies_df to use the filtered data for visualizations
     movies_df = filtered_data
 
@@ -491,7 +457,10 @@ if not movies_df.empty:
             with col2:
                 # Genre distribution
                 st.subheader("Genre Distribution")
-                genre_counts = movies_df["genre"].value_counts().reset_index()
+                if genre_rollups is not None:
+                    genre_counts = genre_rollups["count"].astype(int).sort_values(ascending=False).reset_index()
+                else:
+                    genre_counts = movies_df["genre"].value_counts().reset_index()
                 genre_counts.columns = ["genre", "count"]
                 
                 fig = px.pie(
@@ -551,7 +520,7 @@ if not movies_df.empty:
     if has_duration and has_genre:
         st.subheader("⏳ Average Movie Duration by Genre")
         if len(movies_df) > 0:
-            avg_duration = movies_df.groupby("genre")["Duration_Minutes"].mean().reset_index()
+            avg_duration = genre_average(movies_df, genre_rollups, "Duration_Minutes", "duration_sum")
             
             fig_duration = px.bar(
                 avg_duration,
@@ -566,7 +535,7 @@ if not movies_df.empty:
     if has_votes and has_genre:
         st.subheader("📊 Genres with Highest Average Votes")
         if len(movies_df) > 0:
-            avg_votes = movies_df.groupby("genre")["Votes"].mean().reset_index()
+            avg_votes = genre_average(movies_df, genre_rollups, "Votes", "votes_sum")
             
             fig_votes = px.bar(
                 avg_votes,
@@ -605,7 +574,7 @@ if not movies_df.empty:
     if has_rating and has_genre:
         st.subheader("⭐ Average Ratings by Genre")
         if len(movies_df) > 0:
-            avg_ratings = movies_df.groupby("genre")["Rating"].mean().reset_index()
+            avg_ratings = genre_average(movies_df, genre_rollups, "Rating", "rating_sum")
             
             fig_genre_ratings = px.bar(
                 avg_ratings,
@@ -0,0 +1,270 @@
+import argparse
+import csv
+import os
+import re
+import sqlite3
+from datetime import datetime, timezone
+
+from queries import to_number
+
+# Loads the genre-wise scrape CSVs into the movies table and records what
+# changed in a change log, so running dashboards and the query API can patch
+# their cached data with only the changed rows instead of reloading everything.
+#
+#   python ingest.py --csv-folder . --db movies_2024.db
+#
+# Every ingest that changes something gets the next generation number.
+# movie_changes holds the inserted/updated/deleted movie ids per generation and
+# ingest_generations one summary row per generation.
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "movies_2024.db")
+
+# Merged output of the scraping notebook; its rows are already in the genre files
+EXCLUDED_CSVS = {"all_movies_2024.csv"}
+
+# Strings pandas' read_csv treats as missing, which is how the existing rows
+# were loaded by the scraping notebook
+NA_VALUES = {"", "N/A", "NA", "n/a", "NaN", "nan", "null", "NULL", "None", "#N/A", "<NA>"}
+
+# Generations kept in the change log; consumers older than that do a full reload
+DEFAULT_KEEP_GENERATIONS = 100
+
+# SQLite's default limit on bound parameters is 999
+MAX_SQL_PARAMS = 900
+
+
+# Scraped titles carry their list rank ("12. Twisters"), which moves between
+# scrapes, so movies are grouped on the title without it plus the genre.
+# Different films can share a key ("132. Karma" and "556. Karma"), see match_group.
+def movie_key(title, genre):
+    title = re.sub(r"^\d+\.\s*", "", str(title or "")).strip().lower()
+    return title, genre
+
+
+def table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+# Create the change log tables and give movies a stable movie_id. Tables written
+# by pandas' to_sql have no primary key, and their implicit rowid may be
+# renumbered by VACUUM, so the table is rebuilt once with movie_id as its rowid.
+# AUTOINCREMENT keeps the id of a deleted movie from being handed to a new one.
+def ensure_change_log(conn):
+    columns = conn.execute("PRAGMA table_info(movies)").fetchall()
+    table_sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'movies'").fetchone()
+    if not columns:
+        conn.execute(
+            "CREATE TABLE movies (movie_id INTEGER PRIMARY KEY AUTOINCREMENT, Title TEXT, genre TEXT, "
+            "Rating REAL, Votes TEXT, Duration TEXT)"
+        )
+    elif "AUTOINCREMENT" not in table_sql[0].upper():
+        names = [column[1] for column in columns if column[1] != "movie_id"]
+        definitions = ", ".join(f'"{column[1]}" {column[2]}'.strip() for column in columns if column[1] in names)
+        quoted = ", ".join(f'"{name}"' for name in names)
+        source_id = "movie_id" if len(names) < len(columns) else "rowid"
+        conn.execute(f"CREATE TABLE movies_migrated (movie_id INTEGER PRIMARY KEY AUTOINCREMENT, {definitions})")
+        conn.execute(
+            f"INSERT INTO movies_migrated (movie_id, {quoted}) "
+            f"SELECT {source_id}, {quoted} FROM movies ORDER BY {source_id}"
+        )
+        conn.execute("DROP TABLE movies")
+        conn.execute("ALTER TABLE movies_migrated RENAME TO movies")
+
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS ingest_generations ("
+        "generation INTEGER PRIMARY KEY, ingested_at TEXT NOT NULL, "
+        "inserted INTEGER NOT NULL, updated INTEGER NOT NULL, deleted INTEGER NOT NULL)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS movie_changes ("
+        "generation INTEGER NOT NULL, movie_id INTEGER NOT NULL, op TEXT NOT NULL, "
+        "PRIMARY KEY (generation, movie_id))"
+    )
+
+
+# Latest ingest generation, 0 if nothing was ever ingested with a change log
+def current_generation(conn):
+    if not table_columns(conn, "ingest_generations"):
+        return 0
+    return conn.execute("SELECT COALESCE(MAX(generation), 0) FROM ingest_generations").fetchone()[0]
+
+
+# Oldest generation whose changes are still in the log
+def oldest_generation(conn):
+    if not table_columns(conn, "ingest_generations"):
+        return 0
+    return conn.execute("SELECT COALESCE(MIN(generation), 0) FROM ingest_generations").fetchone()[0]
+
+
+# Ids of movies inserted, updated or deleted after `generation`, or None when
+# the log no longer reaches back that far and the caller has to reload
+def changed_movie_ids(conn, generation):
+    if generation < oldest_generation(conn) - 1:
+        return None
+    rows = conn.execute("SELECT DISTINCT movie_id FROM movie_changes WHERE generation > ?", (generation,))
+    return {row[0] for row in rows}
+
+
+# Current rows for the given movie ids; ids missing from the result were deleted
+def fetch_movies(conn, movie_ids):
+    movie_ids = list(movie_ids)
+    cursor = None
+    rows = []
+    for start in range(0, len(movie_ids), MAX_SQL_PARAMS):
+        batch = movie_ids[start:start + MAX_SQL_PARAMS]
+        placeholders = ", ".join("?" * len(batch))
+        cursor = conn.execute(f"SELECT * FROM movies WHERE movie_id IN ({placeholders})", batch)
+        rows.extend(cursor.fetchall())
+    columns = [description[0] for description in cursor.description] if cursor else table_columns(conn, "movies")
+    return columns, rows
+
+
+# Function to read the genre-wise CSVs, taking the genre from the file name
+def read_genre_csvs(csv_folder, excluded=EXCLUDED_CSVS):
+    records = []
+    for file in sorted(os.listdir(csv_folder)):
+        if not file.endswith(".csv") or file in excluded:
+            continue
+        genre_name = os.path.splitext(file)[0]
+        with open(os.path.join(csv_folder, file), newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                records.append({
+                    "Title": row.get("Title"),
+                    "genre": genre_name,
+                    "Rating": row.get("Rating"),
+                    "Votes": row.get("Votes"),
+                    "Duration": row.get("Duration"),
+                })
+    return records
+
+
+def missing_to_none(value):
+    return None if value is None or value in NA_VALUES else value
+
+
+def normalize_values(title, rating, votes, duration):
+    return missing_to_none(title), to_number(rating), to_number(votes), missing_to_none(duration)
+
+
+# Pair the existing and incoming rows that share a movie_key: identical rows
+# first, then rows with the same Duration, then the rest in order. Returns the
+# pairs plus the existing and incoming rows left over.
+def match_group(existing_rows, incoming_rows):
+    remaining = list(existing_rows)
+    pending = list(incoming_rows)
+    pairs = []
+    for same in (
+        lambda current, values: current == values,
+        lambda current, values: current[3] == values[3],
+        lambda current, values: True,
+    ):
+        unmatched = []
+        for record, values in pending:
+            for index, (movie_id, current) in enumerate(remaining):
+                if same(current, values):
+                    pairs.append((movie_id, current, record, values))
+                    del remaining[index]
+                    break
+            else:
+                unmatched.append((record, values))
+        pending = unmatched
+    return pairs, remaining, pending
+
+
+# Upsert the scraped records and delete movies that are no longer listed in the
+# genres being ingested, recording every change under a new generation. Genres
+# that are not part of `records` are left untouched.
+def ingest_movies(conn, records, keep_generations=DEFAULT_KEEP_GENERATIONS):
+    incoming = {}
+    for record in records:
+        values = normalize_values(record["Title"], record["Rating"], record["Votes"], record["Duration"])
+        incoming.setdefault(movie_key(record["Title"], record["genre"]), []).append((record, values))
+    genres = sorted({record["genre"] for record in records})
+
+    with conn:
+        # Take the write lock up front so the migration and the change log
+        # commit together with the data
+        conn.execute("BEGIN IMMEDIATE")
+        ensure_change_log(conn)
+
+        existing = {}
+        placeholders = ", ".join("?" * len(genres))
+        rows = conn.execute(
+            f"SELECT movie_id, Title, genre, Rating, Votes, Duration FROM movies WHERE genre IN ({placeholders})",
+            genres,
+        )
+        for movie_id, title, genre, rating, votes, duration in rows:
+            key = movie_key(title, genre)
+            existing.setdefault(key, []).append((movie_id, normalize_values(title, rating, votes, duration)))
+
+        inserted = []
+        updated = []
+        deleted = []
+        for key in existing.keys() | incoming.keys():
+            pairs, surplus_existing, surplus_incoming = match_group(existing.get(key, []), incoming.get(key, []))
+            for movie_id, current, record, values in pairs:
+                if current != values:
+                    conn.execute(
+                        "UPDATE movies SET Title = ?, Rating = ?, Votes = ?, Duration = ? WHERE movie_id = ?",
+                        (*values, movie_id),
+                    )
+                    updated.append(movie_id)
+            for record, values in surplus_incoming:
+                cursor = conn.execute(
+                    "INSERT INTO movies (Title, genre, Rating, Votes, Duration) VALUES (?, ?, ?, ?, ?)",
+                    (values[0], record["genre"], *values[1:]),
+                )
+                inserted.append(cursor.lastrowid)
+            deleted.extend(movie_id for movie_id, _ in surplus_existing)
+
+        conn.executemany("DELETE FROM movies WHERE movie_id = ?", [(movie_id,) for movie_id in deleted])
+
+        generation = current_generation(conn)
+        if inserted or updated or deleted:
+            generation += 1
+            conn.execute(
+                "INSERT INTO ingest_generations (generation, ingested_at, inserted, updated, deleted) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (generation, datetime.now(timezone.utc).isoformat(), len(inserted), len(updated), len(deleted)),
+            )
+            conn.executemany(
+                "INSERT INTO movie_changes (generation, movie_id, op) VALUES (?, ?, ?)",
+                [(generation, movie_id, "inserted") for movie_id in inserted]
+                + [(generation, movie_id, "updated") for movie_id in updated]
+                + [(generation, movie_id, "deleted") for movie_id in deleted],
+            )
+            if keep_generations > 0:
+                oldest_kept = generation - keep_generations + 1
+                conn.execute("DELETE FROM movie_changes WHERE generation < ?", (oldest_kept,))
+                conn.execute("DELETE FROM ingest_generations WHERE generation < ?", (oldest_kept,))
+
+    return {"generation": generation, "inserted": len(inserted), "updated": len(updated), "deleted": len(deleted)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest scraped genre CSVs into the movies database")
+    parser.add_argument("--csv-folder", default=os.path.dirname(os.path.abspath(__file__)),
+                        help="Folder with one <genre>.csv per genre")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Path to the movies SQLite database")
+    parser.add_argument("--keep-generations", type=int, default=DEFAULT_KEEP_GENERATIONS,
+                        help="Generations kept in the change log (0 keeps all)")
+    args = parser.parse_args()
+
+    records = read_genre_csvs(args.csv_folder)
+    if not records:
+        parser.error(f"No CSV files found in {args.csv_folder}")
+
+    conn = sqlite3.connect(args.db)
+    try:
+        result = ingest_movies(conn, records, args.keep_generations)
+    finally:
+        conn.close()
+
+    print(
+        f"Generation {result['generation']}: {result['inserted']} inserted, "
+        f"{result['updated']} updated, {result['deleted']} deleted"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import time
+from urllib.parse import quote_plus, urlsplit
+
+# Local load test for api.py. Replays a mix of dashboard queries at increasing
+# concurrency and reports throughput and latency percentiles per level.
+#
+#   python api.py --port 8000 &
+#   python loadtest.py --url http://127.0.0.1:8000 --levels 1,4,16,64 --duration 10
+#
+# The default mix repeats a few URLs, so after warm-up it mostly measures the
+# result cache. --unique makes every request a distinct filter query, which
+# always reaches the thread pool. To measure the pool and request coalescing
+# with the repeating mix, run the server with --cache-size 0. The cache hits,
+# database reads and coalesced requests the server counted are printed for
+# each level.
+
+NL_QUERIES = [
+    "Show all action movies",
+    "Give me the top 5 highest rated movies",
+    "Show movies with rating above 8",
+    "List all horror movies with rating above 7",
+    "What is the average rating by genre?",
+    "Show movies sorted by duration in ascending order",
+    "Show the longest sci-fi movie",
+    "Count the number of movies by genre",
+]
+
+FILTER_QUERIES = [
+    "genre=action&min_rating=7&limit=50",
+    "genre=drama&sort=votes&limit=50",
+    "min_rating=8&max_duration=120&limit=100",
+    "genre=horror&sort=duration_asc&limit=20",
+]
+
+REQUEST_PATHS = (
+    [f"/query?q={quote_plus(query)}" for query in NL_QUERIES]
+    + [f"/movies?{query}" for query in FILTER_QUERIES]
+)
+
+
+# Filter queries made unique with a min_votes bound below every movie, so each
+# request misses the cache but returns the same rows
+def unique_paths(counter):
+    for n in counter:
+        yield f"/movies?{FILTER_QUERIES[n % len(FILTER_QUERIES)]}&min_votes=-{n + 1}"
+
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    index = max(math.ceil(percent / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    status = int(status_line.split(" ", 2)[1])
+    headers = {}
+    for line in header_lines:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+
+    if headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get("content-length", 0)))
+
+    return status, headers.get("connection", "").lower() != "close"
+
+
+async def get_stats(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(f"GET /stats HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode("latin-1"))
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return json.loads(response.split(b"\r\n\r\n", 1)[1])
+
+
+# One client with a keep-alive connection, sending requests back to back
+async def client(host, port, paths, deadline, latencies, errors):
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        path = next(paths)
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            started = time.perf_counter()
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode("latin-1"))
+            await writer.drain()
+            status, keep_alive = await read_response(reader)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors.append(status)
+            if not keep_alive:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError) as e:
+            errors.append(type(e).__name__)
+            if writer is not None:
+                writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_level(host, port, concurrency, duration, counter=None):
+    latencies = []
+    errors = []
+    before = await get_stats(host, port)
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        # Offset each client so the mix isn't sent in lockstep
+        client(
+            host,
+            port,
+            unique_paths(counter) if counter else itertools.islice(itertools.cycle(REQUEST_PATHS), i, None),
+            deadline,
+            latencies,
+            errors,
+        )
+        for i in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - started
+    after = await get_stats(host, port)
+    latencies.sort()
+    return {
+        **{name: after[name] - before[name] for name in ("cache_hits", "db_reads", "coalesced")},
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+    }
+
+
+async def main_async(args):
+    url = urlsplit(args.url)
+    host, port = url.hostname or "127.0.0.1", url.port or 80
+    levels = [int(level) for level in args.levels.split(",") if level.strip()]
+
+    # Shared by all clients so no two unique requests repeat
+    counter = itertools.count() if args.unique else None
+
+    mix = "unique filter queries" if args.unique else "repeating query mix"
+    print(f"Load testing {args.url} for {args.duration:g}s per level ({mix})")
+    print(
+        f"{'concurrency':>11} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} "
+        f"{'cache hits':>10} {'db reads':>9} {'coalesced':>9}"
+    )
+    for concurrency in levels:
+        result = await run_level(host, port, concurrency, args.duration, counter)
+        print(
+            f"{result['concurrency']:>11} {result['requests']:>9} {result['errors']:>7} "
+            f"{result['throughput']:>9.1f} {result['p50']:>8.2f} {result['p99']:>8.2f} "
+            f"{result['cache_hits']:>10} {result['db_reads']:>9} {result['coalesced']:>9}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the movies query API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--levels", default="1,2,4,8,16,32,64", help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds to run each level")
+    parser.add_argument("--unique", action="store_true",
+                        help="Send a distinct filter query per request so none is served from the cache")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import pandas as pd
+
+from ingest import changed_movie_ids, current_generation, fetch_movies
+from queries import convert_to_minutes
+
+# Movie data behind the Standard Dashboard: the prepared movies frame keyed by
+# movie_id plus per-genre rollups. app.py keeps one store per server process;
+# after an ingest only the changed rows are fetched and patched in.
+
+# Changed rows above this fraction of the cached movies are cheaper to
+# reload in full than to patch in
+FULL_RELOAD_FRACTION = 0.5
+
+
+# Function to convert Rating and Votes to numbers and fill missing values
+def convert_movie_types(df):
+    if 'Rating' in df.columns:
+        df["Rating"] = pd.to_numeric(df["Rating"], errors='coerce')
+    if 'Votes' in df.columns:
+        df["Votes"] = pd.to_numeric(df["Votes"], errors='coerce')
+    return df.fillna(0)
+
+
+# Function to prepare movie rows for the Standard Dashboard, keyed by movie_id
+def prepare_movies(df):
+    df = convert_movie_types(df)
+
+    # Convert Duration to Minutes and drop rows with invalid durations. The
+    # cast keeps the column numeric even when there are no rows to apply to.
+    df["Duration_Minutes"] = df["Duration"].apply(convert_to_minutes).astype(float)
+    df = df.dropna(subset=["Duration_Minutes"])
+
+    if 'movie_id' in df.columns:
+        df = df.set_index("movie_id")
+    return df
+
+
+# Function to total the per-genre values the genre charts average over
+def summarize_genres(df):
+    return df.groupby("genre").agg(
+        count=("Rating", "size"),
+        rating_sum=("Rating", "sum"),
+        votes_sum=("Votes", "sum"),
+        duration_sum=("Duration_Minutes", "sum"),
+    )
+
+
+def reload_movie_store(store, conn, generation):
+    df = prepare_movies(pd.read_sql("SELECT * FROM movies", conn))
+    store.update(
+        generation=generation,
+        df=df,
+        genre_rollups=summarize_genres(df),
+    )
+
+
+def patch_movie_store(store, conn, generation, movie_ids):
+    columns, rows = fetch_movies(conn, movie_ids)
+    changed = prepare_movies(pd.DataFrame.from_records(rows, columns=columns))
+
+    # Take out the previous version of every changed movie, then add back
+    # the ones that still exist
+    df = store["df"]
+    previous = df[df.index.isin(list(movie_ids))]
+    genre_rollups = (
+        store["genre_rollups"]
+        .sub(summarize_genres(previous), fill_value=0)
+        .add(summarize_genres(changed), fill_value=0)
+    )
+    genre_rollups = genre_rollups[genre_rollups["count"] > 0].astype({"count": int})
+
+    df = df.drop(previous.index)
+    # Concatenating an empty frame (a delete-only generation) would turn the
+    # cached columns into object dtype
+    if not changed.empty:
+        df = pd.concat([df, changed])
+
+    store.update(generation=generation, df=df, genre_rollups=genre_rollups)
+
+
+# Bring the store up to the database's latest ingest generation
+def refresh_movie_store(store, conn):
+    generation = current_generation(conn)
+    if store["df"] is None or generation < store["generation"]:
+        reload_movie_store(store, conn, generation)
+    elif generation > store["generation"]:
+        movie_ids = None
+        if store["df"].index.name == "movie_id":
+            movie_ids = changed_movie_ids(conn, store["generation"])
+        if movie_ids is None or len(movie_ids) > FULL_RELOAD_FRACTION * len(store["df"]):
+            reload_movie_store(store, conn, generation)
+        else:
+            patch_movie_store(store, conn, generation, movie_ids)
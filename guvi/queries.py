@@ -0,0 +1,99 @@
+import math
+import re
+
+# Shared query helpers used by both the Streamlit dashboard (app.py) and the
+# headless query service (api.py). Keep this module free of Streamlit and
+# pandas imports so it can be loaded outside of a Streamlit session.
+
+# Function to convert duration to minutes
+def convert_to_minutes(duration):
+    try:
+        hours = 0
+        minutes = 0
+        if 'h' in duration:
+            hours = int(duration.split('h')[0].strip())
+        if 'm' in duration:
+            minutes = int(duration.split('h')[-1].replace('m', '').strip()) if 'h' in duration else int(duration.replace('m', '').strip())
+        return hours * 60 + minutes
+    except:
+        return None  # Return None for invalid formats
+
+# Function to convert a value to a number the way pd.to_numeric(errors='coerce') does
+def to_number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(number) else number
+
+# Function to escape free text placed inside a quoted SQL string literal
+def sql_string(text):
+    return text.replace("'", "''")
+
+# Function to generate SQL query from natural language
+def generate_sql_query(user_query):
+    user_query = user_query.lower()
+    
+    # Dictionary of common query patterns and corresponding SQL
+    query_patterns = {
+        # Duration-related queries
+        r"duration.*(asc|ascending|shortest|short)": "SELECT * FROM movies ORDER BY Duration_Minutes ASC",
+        r"duration.*(desc|descending|longest|long)": "SELECT * FROM movies ORDER BY Duration_Minutes DESC",
+        
+        # Rating-related queries
+        r"highest.*(rating|rated)": "SELECT * FROM movies ORDER BY Rating DESC",
+        r"lowest.*(rating|rated)": "SELECT * FROM movies ORDER BY Rating ASC",
+        r"rating.*above (\d+\.?\d*)": lambda match: f"SELECT * FROM movies WHERE Rating > {match.group(1)}",
+        r"rating.*between (\d+\.?\d*) and (\d+\.?\d*)": lambda match: f"SELECT * FROM movies WHERE Rating BETWEEN {match.group(1)} AND {match.group(2)}",
+        
+        # Vote-related queries
+        r"(most popular|highest vote|most votes)": "SELECT * FROM movies ORDER BY Votes DESC",
+        r"(least popular|lowest vote|fewest votes)": "SELECT * FROM movies ORDER BY Votes ASC",
+        r"votes?.*above (\d+)": lambda match: f"SELECT * FROM movies WHERE Votes > {match.group(1)}",
+        
+        # Genre-related queries
+        r"(all|show|list) (\w+) movies": lambda match: f"SELECT * FROM movies WHERE genre = '{match.group(2)}'",
+        r"(\w+) movies.*(rating|rated).*above (\d+\.?\d*)": lambda match: f"SELECT * FROM movies WHERE genre = '{match.group(1)}' AND Rating > {match.group(3)}",
+        
+        # Title-related queries
+        r"title.*(contain|including|with) (.+)": lambda match: f"SELECT * FROM movies WHERE Title LIKE '%{sql_string(match.group(2))}%'",
+        
+        # Top N queries
+        r"top (\d+).*rating": lambda match: f"SELECT * FROM movies ORDER BY Rating DESC LIMIT {match.group(1)}",
+        r"top (\d+).*votes": lambda match: f"SELECT * FROM movies ORDER BY Votes DESC LIMIT {match.group(1)}",
+        r"top (\d+) (\w+) movies": lambda match: f"SELECT * FROM movies WHERE genre = '{match.group(2)}' ORDER BY Rating DESC LIMIT {match.group(1)}",
+        
+        # Average queries
+        r"average.*rating.*genre": "SELECT genre, AVG(Rating) as avg_rating FROM movies GROUP BY genre ORDER BY avg_rating DESC",
+        r"average.*duration.*genre": "SELECT genre, AVG(Duration_Minutes) as avg_duration FROM movies GROUP BY genre ORDER BY avg_duration DESC",
+        
+        # Count queries
+        r"(count|number of|how many).*(\w+) movies": lambda match: f"SELECT COUNT(*) as movie_count FROM movies WHERE genre = '{match.group(2)}'",
+        r"(count|number of|how many).*(genre|movies)": "SELECT genre, COUNT(*) as movie_count FROM movies GROUP BY genre ORDER BY movie_count DESC",
+        
+        # Above/below average
+        r"above.*(average|avg).*rating": "SELECT * FROM movies WHERE Rating > (SELECT AVG(Rating) FROM movies)",
+        r"below.*(average|avg).*rating": "SELECT * FROM movies WHERE Rating < (SELECT AVG(Rating) FROM movies)",
+        
+        # Best/worst in genre
+        r"(best|highest).* (\w+)": lambda match: f"SELECT * FROM movies WHERE genre = '{match.group(2)}' ORDER BY Rating DESC LIMIT 1",
+        r"(worst|lowest).* (\w+)": lambda match: f"SELECT * FROM movies WHERE genre = '{match.group(2)}' ORDER BY Rating ASC LIMIT 1",
+        
+        # Runtime queries
+        r"(shorter|less) than (\d+).*minutes": lambda match: f"SELECT * FROM movies WHERE Duration_Minutes < {match.group(2)}",
+        r"(longer|more) than (\d+).*minutes": lambda match: f"SELECT * FROM movies WHERE Duration_Minutes > {match.group(2)}",
+        
+        # Default query if no pattern matches
+        "default": "SELECT * FROM movies"
+    }
+    
+    # Try to match the user query with patterns and get corresponding SQL
+    for pattern, sql in query_patterns.items():
+        match = re.search(pattern, user_query)
+        if match:
+            if callable(sql):
+                return sql(match)
+            return sql
+    
+    # If no pattern matches, return the default query
+    return query_patterns["default"]
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+from api import MAX_BODY_BYTES, MAX_HEADER_BYTES, QueryService
+from ingest import ingest_movies, read_genre_csvs
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+WESTERNS = "SELECT Title, Duration_Minutes FROM movies WHERE genre = 'western' ORDER BY Title"
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    db_path = tmp_path / "movies_2024.db"
+    shutil.copy(os.path.join(HERE, "movies_2024.db"), db_path)
+    return str(db_path)
+
+
+# Run scenario(port) against the service listening on an ephemeral port
+def run_server(service, scenario):
+    async def main():
+        server = await asyncio.start_server(service.handle_connection, "127.0.0.1", 0, limit=MAX_HEADER_BYTES)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            async with server:
+                return await scenario(port)
+        finally:
+            service.executor.shutdown(wait=True)
+
+    return asyncio.run(main())
+
+
+# Send one raw request and read the response until the server closes it
+async def send(port, request):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(request)
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+
+    head, body = response.split(b"\r\n\r\n", 1)
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    headers = dict(line.lower().split(": ", 1) for line in header_lines)
+    if headers.get("transfer-encoding") == "chunked":
+        chunks = []
+        while True:
+            size, body = body.split(b"\r\n", 1)
+            size = int(size, 16)
+            if size == 0:
+                break
+            chunks.append(body[:size])
+            body = body[size + 2:]
+        body = b"".join(chunks)
+    return int(status_line.split(" ", 2)[1]), headers, body
+
+
+async def get(port, path, version="HTTP/1.1"):
+    return await send(port, f"GET {path} {version}\r\nHost: test\r\nConnection: close\r\n\r\n".encode("latin-1"))
+
+
+def test_identical_inflight_reads_are_coalesced(db_path):
+    service = QueryService(db_path)
+
+    async def scenario(port):
+        return await asyncio.gather(service.fetch(WESTERNS), service.fetch(WESTERNS))
+
+    first, second = run_server(service, scenario)
+    assert first == second
+    assert (service.stats["db_reads"], service.stats["coalesced"], service.stats["cache_hits"]) == (1, 1, 0)
+
+
+def test_a_new_ingest_generation_drops_cached_results(db_path):
+    service = QueryService(db_path, poll_interval=0.01)
+    records = [record for record in read_genre_csvs(HERE) if record["genre"] == "western"]
+    extra = {"Title": "9999. Brand New", "genre": "western", "Rating": "7.1", "Votes": "1200", "Duration": "1h 40m"}
+
+    async def scenario(port):
+        watcher = asyncio.create_task(service.watch_generation())
+        try:
+            before = await service.fetch(WESTERNS)
+            assert await service.fetch(WESTERNS) == before
+            assert (service.stats["db_reads"], service.stats["cache_hits"]) == (1, 1)
+
+            conn = sqlite3.connect(db_path)
+            generation = ingest_movies(conn, records + [extra])["generation"]
+            conn.close()
+            while service.generation != generation:
+                await asyncio.sleep(0.01)
+            assert len(service.cache) == 0
+
+            after = await service.fetch(WESTERNS)
+            assert service.stats["db_reads"] == 2
+            return before, after
+        finally:
+            watcher.cancel()
+
+    before, after = run_server(service, scenario)
+    assert len(after[1]) == len(before[1]) + 1
+    assert json.dumps({"Title": extra["Title"], "Duration_Minutes": 100}).encode("utf-8") in after[1]
+
+
+def test_a_query_past_the_deadline_returns_503(db_path):
+    service = QueryService(db_path, query_timeout=0.0)
+
+    async def scenario(port):
+        return await get(port, "/movies")
+
+    status, _, body = run_server(service, scenario)
+    assert status == 503
+    assert "time limit" in json.loads(body)["error"]
+
+
+@pytest.mark.parametrize("length, expected", [("abc", 400), ("-1", 400), (str(MAX_BODY_BYTES + 1), 413)])
+def test_bad_content_length_is_rejected(db_path, length, expected):
+    service = QueryService(db_path)
+
+    async def scenario(port):
+        request = f"GET /health HTTP/1.1\r\nHost: test\r\nContent-Length: {length}\r\n\r\n"
+        return await send(port, request.encode("latin-1"))
+
+    status, headers, _ = run_server(service, scenario)
+    assert status == expected
+    assert headers["connection"] == "close"
+
+
+def test_results_over_the_stream_threshold_are_sent_as_ndjson(db_path):
+    service = QueryService(db_path, stream_threshold=5)
+
+    async def scenario(port):
+        return (
+            await get(port, "/movies?genre=action&limit=5"),
+            await get(port, "/movies?genre=action&limit=6"),
+            await get(port, "/movies?genre=action&limit=6", version="HTTP/1.0"),
+        )
+
+    small, large, http10 = run_server(service, scenario)
+
+    status, headers, body = small
+    assert (status, headers["content-type"]) == (200, "application/json")
+    assert json.loads(body)["count"] == 5
+
+    status, headers, body = large
+    assert (status, headers["content-type"], headers["transfer-encoding"]) == (200, "application/x-ndjson", "chunked")
+    assert len([json.loads(line) for line in body.splitlines()]) == 6
+
+    # HTTP/1.0 clients get the same lines without chunked encoding
+    status, headers, http10_body = http10
+    assert "transfer-encoding" not in headers
+    assert (status, headers["connection"], http10_body) == (200, "close", body)
@@ -0,0 +1,100 @@
+import os
+import shutil
+import sqlite3
+from collections import Counter
+
+from ingest import current_generation, ingest_movies, normalize_values, read_genre_csvs
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def copy_database(tmp_path):
+    db_path = tmp_path / "movies_2024.db"
+    shutil.copy(os.path.join(HERE, "movies_2024.db"), db_path)
+    return sqlite3.connect(db_path)
+
+
+def stored_movies(conn):
+    rows = conn.execute("SELECT genre, Title, Rating, Votes, Duration FROM movies")
+    return Counter((genre, *normalize_values(*values)) for genre, *values in rows)
+
+
+def listed_movies(records):
+    return Counter(
+        (record["genre"], *normalize_values(record["Title"], record["Rating"], record["Votes"], record["Duration"]))
+        for record in records
+    )
+
+
+def test_reingesting_the_same_csvs_is_a_no_op(tmp_path):
+    conn = copy_database(tmp_path)
+    records = read_genre_csvs(HERE)
+
+    # The shipped database still holds a few rows from an earlier scrape that
+    # the CSVs no longer list; the first ingest removes only those
+    stale = stored_movies(conn) - listed_movies(records)
+    first = ingest_movies(conn, records)
+    assert (first["inserted"], first["updated"], first["deleted"]) == (0, 0, sum(stale.values()))
+    assert stored_movies(conn) == listed_movies(records)
+
+    generation = current_generation(conn)
+    second = ingest_movies(conn, records)
+    assert second == {"generation": generation, "inserted": 0, "updated": 0, "deleted": 0}
+    assert current_generation(conn) == generation
+
+
+def action_records():
+    return [record for record in read_genre_csvs(HERE) if record["genre"] == "action"]
+
+
+def karma_rows(conn):
+    return conn.execute(
+        "SELECT Title, Rating FROM movies WHERE genre = 'action' AND Title LIKE '%. Karma' ORDER BY movie_id"
+    ).fetchall()
+
+
+def test_same_title_films_are_matched_separately(tmp_path):
+    conn = copy_database(tmp_path)
+    records = action_records()
+    ingest_movies(conn, records)
+
+    karmas = [record for record in records if record["Title"].endswith(". Karma")]
+    assert len(karmas) > 1
+    karmas[-1]["Rating"] = "9.9"
+    result = ingest_movies(conn, records)
+
+    assert (result["inserted"], result["updated"], result["deleted"]) == (0, 1, 0)
+    rows = karma_rows(conn)
+    assert len(rows) == len(karmas)
+    assert rows[-1] == (karmas[-1]["Title"], 9.9)
+
+
+def test_a_shrinking_title_group_deletes_the_dropped_film(tmp_path):
+    conn = copy_database(tmp_path)
+    records = action_records()
+    ingest_movies(conn, records)
+
+    dropped = [record for record in records if record["Title"].endswith(". Karma")][0]
+    records.remove(dropped)
+    result = ingest_movies(conn, records)
+
+    assert (result["inserted"], result["updated"], result["deleted"]) == (0, 0, 1)
+    titles = [title for title, _ in karma_rows(conn)]
+    assert dropped["Title"] not in titles
+    action = Counter({movie: count for movie, count in stored_movies(conn).items() if movie[0] == "action"})
+    assert action == listed_movies(records)
+
+
+def test_a_deleted_movie_id_is_not_reused(tmp_path):
+    conn = copy_database(tmp_path)
+    records = action_records()
+    ingest_movies(conn, records)
+
+    extra = {"Title": "9999. Brand New", "genre": "action", "Rating": "7.1", "Votes": "1200", "Duration": "1h 40m"}
+    ingest_movies(conn, records + [extra])
+    (deleted_id,) = conn.execute("SELECT MAX(movie_id) FROM movies").fetchone()
+    ingest_movies(conn, records)
+    ingest_movies(conn, records + [dict(extra, Title="9999. Newer")])
+
+    (new_id,) = conn.execute("SELECT movie_id FROM movies WHERE Title = '9999. Newer'").fetchone()
+    assert new_id > deleted_id
@@ -0,0 +1,62 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+import movie_store
+from ingest import ingest_movies, read_genre_csvs
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Kept before the test replaces it on the module
+reload_movie_store = movie_store.reload_movie_store
+
+
+def reloaded(conn):
+    fresh = {}
+    reload_movie_store(fresh, conn, None)
+    return fresh
+
+
+def assert_matches_reload(store, conn):
+    fresh = reloaded(conn)
+    pd.testing.assert_frame_equal(store["df"].sort_index(), fresh["df"].sort_index())
+    pd.testing.assert_frame_equal(store["genre_rollups"].sort_index(), fresh["genre_rollups"].sort_index())
+
+
+@pytest.fixture
+def conn(tmp_path):
+    db_path = tmp_path / "movies_2024.db"
+    shutil.copy(os.path.join(HERE, "movies_2024.db"), db_path)
+    return sqlite3.connect(db_path)
+
+
+def test_patched_store_matches_a_full_reload(conn, monkeypatch):
+    records = [record for record in read_genre_csvs(HERE) if record["genre"] == "action"]
+    ingest_movies(conn, records)
+
+    store = {"generation": None, "df": None, "genre_rollups": None}
+    movie_store.refresh_movie_store(store, conn)
+
+    # From here on every refresh has to patch
+    def no_reload(*args):
+        raise AssertionError("expected a patch, not a full reload")
+    monkeypatch.setattr(movie_store, "reload_movie_store", no_reload)
+
+    inserted = records + [{"Title": "9999. Brand New", "genre": "action", "Rating": "7.1",
+                           "Votes": "1200", "Duration": "1h 40m"}]
+    updated = [dict(record) for record in inserted]
+    updated[0]["Rating"] = "9.9"
+    deleted = updated[:1] + updated[2:]
+
+    for step, expected in ((inserted, (1, 0, 0)), (updated, (0, 1, 0)), (deleted, (0, 0, 1))):
+        result = ingest_movies(conn, step)
+        assert (result["inserted"], result["updated"], result["deleted"]) == expected
+
+        movie_store.refresh_movie_store(store, conn)
+        assert store["generation"] == result["generation"]
+        assert store["df"]["Duration_Minutes"].dtype == float
+        assert_matches_reload(store, conn)